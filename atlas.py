@@ -0,0 +1,121 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+import pygame
+
+
+VERSION = 1
+MAGIC = b'RUMMYATL'
+RESOLUTIONS = ((1280, 720), (1920, 1080))
+NAMES = [str(i) for i in range(54)] + ['sort']
+DIVISORS = {'sort': 7}
+WIDTH = 2048
+
+
+def file_name(resolution):
+    return f'atlas-{resolution[0]}x{resolution[1]}.bin'
+
+
+def cache_dir():
+    root = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'rummy')
+
+
+def signature(base_path):
+    digest = hashlib.sha1(str(VERSION).encode())
+    for name in NAMES:
+        digest.update(f'{name}:{os.path.getsize(os.path.join(base_path, "images", f"{name}.png"))};'.encode())
+    return digest.hexdigest()
+
+
+def build(base_path, resolution):
+    scale = resolution[1] / 720
+    images = {}
+    for name in NAMES:
+        image = pygame.image.load(os.path.join(base_path, 'images', f'{name}.png'))
+        divisor = DIVISORS.get(name, 4)
+        images[name] = pygame.transform.scale(image, (int(image.get_width() * scale / divisor),
+                                                      int(image.get_height() * scale / divisor)))
+    rects = {}
+    x = y = row = 0
+    for name in sorted(NAMES, key=lambda name: -images[name].get_height()):
+        width, height = images[name].get_size()
+        if x + width > WIDTH:
+            x, y, row = 0, y + row, 0
+        rects[name] = (x, y, width, height)
+        x += width
+        row = max(row, height)
+    atlas = pygame.Surface((WIDTH, y + row), pygame.SRCALPHA, 32)
+    for name, rect in rects.items():
+        atlas.blit(images[name], rect[:2])
+    return atlas, rects
+
+
+def save(path, atlas, rects, source):
+    header = json.dumps({'size': atlas.get_size(), 'source': source, 'rects': rects}).encode()
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as file:
+        file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        file.write(pygame.image.tobytes(atlas, 'RGBA'))
+    os.replace(tmp, path)
+
+
+def read(path, source, use_mmap=True):
+    try:
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else file.read()
+    except (OSError, ValueError):
+        return None
+    view = memoryview(data)
+    try:
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            return None
+        start = len(MAGIC) + 4
+        length, = struct.unpack('<I', view[len(MAGIC):start])
+        header = json.loads(bytes(view[start:start + length]))
+        if header['source'] != source:
+            return None
+        size = tuple(header['size'])
+        pixels = view[start + length:]
+        if len(pixels) != size[0] * size[1] * 4:
+            return None
+        atlas = pygame.image.frombuffer(pixels, size, 'RGBA')
+        atlas = atlas.convert_alpha() if pygame.display.get_surface() else atlas.copy()
+        rects = header['rects']
+        if sorted(rects) != sorted(NAMES) or not all(map(atlas.get_rect().contains, rects.values())):
+            return None
+        return atlas, rects
+    except (struct.error, ValueError, KeyError, TypeError, pygame.error):
+        return None
+    finally:
+        pixels = None
+        view.release()
+        if use_mmap:
+            data.close()
+
+
+def load(base_path, resolution, use_mmap=True):
+    source = signature(base_path)
+    name = file_name(resolution)
+    for folder in (os.path.join(base_path, 'images'), cache_dir()):
+        if result := read(os.path.join(folder, name), source, use_mmap):
+            break
+    else:
+        result = build(base_path, resolution)
+        try:
+            os.makedirs(cache_dir(), exist_ok=True)
+            save(os.path.join(cache_dir(), name), *result, source)
+        except OSError:
+            pass
+        if pygame.display.get_surface():
+            result = result[0].convert_alpha(), result[1]
+    atlas, rects = result
+    return {int(name) if name.isdigit() else name: atlas.subsurface(rect) for name, rect in rects.items()}
+
+
+def build_all(base_path):
+    source = signature(base_path)
+    for resolution in RESOLUTIONS:
+        save(os.path.join(base_path, 'images', file_name(resolution)), *build(base_path, resolution), source)
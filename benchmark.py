@@ -0,0 +1,155 @@
+import sys
+import json
+import platform
+from argparse import ArgumentParser
+from time import perf_counter
+from random import Random
+import engine
+from enums import States
+from ismcts import ISMCTS, SearchStats
+
+
+PHASES = (States.DRAW, States.MELD, States.LAY_OFF, States.DISCARD)
+
+
+def build_corpus(games=20, seed=0):
+    rng = Random(seed)
+    positions = []
+    for _ in range(games):
+        game = engine.GameState(True, rng.getrandbits(64))
+        game.restart_round()
+        state = game.snapshot()
+        while legal_moves := state.get_moves():
+            positions.append(state.clone())
+            state.do_move(engine.heuristic_move(state, legal_moves))
+    return positions
+
+
+def melds_of(positions):
+    melds = []
+    for state in positions:
+        melds.extend(state.melds)
+        melds.extend(engine.find_melds(state.hands[state.current_player]))
+    return melds
+
+
+def measure(run, items, repeat, setup=None):
+    best = float('inf')
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = perf_counter()
+        run(items)
+        best = min(best, perf_counter() - start)
+    return best / max(len(items), 1)
+
+
+def loop(function):
+    def run(items):
+        for item in items:
+            function(item)
+    return run
+
+
+def do_moves(pairs):
+    for state, move in pairs:
+        state.clone().do_move(move)
+
+
+def clone_moves(pairs):
+    for state, move in pairs:
+        state.clone()
+
+
+def table_meld(cards):
+    meld = engine.Meld()
+    meld.cards = [engine.Card(engine.SUIT_OF[card], engine.RANK_OF[card], engine.SCORE_OF[card])
+                  for card in cards]
+    return meld
+
+
+def clear_plans():
+    engine.meld_plans.cache_clear()
+    engine.layoff_plans.cache_clear()
+
+
+def suite(positions, repeat=5, iterations=2000):
+    rng = Random(0)
+    results = {}
+    results['clone_and_randomize'] = measure(
+        loop(lambda state: state.clone_and_randomize(rng=rng)), positions, repeat)
+    for phase in PHASES:
+        states = [state for state in positions if state.state == phase]
+        results[f'get_moves.{phase.name}'] = measure(loop(engine.State.get_moves), states, repeat)
+        results[f'get_moves.{phase.name}.macro'] = measure(
+            loop(lambda state: state.get_moves(True)), states, repeat, clear_plans)
+    pairs = [(state, rng.choice(moves)) for state in positions if (moves := state.get_moves())]
+    results['do_move'] = max(measure(do_moves, pairs, repeat) - measure(clone_moves, pairs, repeat), 0)
+    hands = [state.hands[state.current_player] for state in positions]
+    results['find_melds'] = measure(loop(engine.find_melds), hands, repeat)
+    melds = melds_of(positions)
+    results['meld_kind'] = measure(loop(engine.meld_kind.__wrapped__), melds, repeat)
+    results['Meld.is_valid'] = measure(loop(engine.Meld.is_valid), list(map(table_meld, melds)), repeat)
+    roots = [state for state in positions[::max(len(positions) // 8, 1)] if len(state.get_moves()) > 1]
+    for name, settings in (('ismcts.iteration', {}),
+                           ('ismcts.iteration.heuristic', {'rollout': engine.heuristic_move, 'depth': 20})):
+        stats = SearchStats()
+        def search(roots):
+            for root in roots:
+                ISMCTS(seed=0, **settings).search(root, float('inf'), iterations=iterations, stats=stats)
+        # search() may stop early once the best move is decided, so count the iterations it ran
+        results[name] = measure(search, roots, 1, clear_plans) * len(roots) / max(stats.iterations, 1)
+    return {name: {'seconds': seconds, 'per_second': 1 / seconds if seconds else None}
+            for name, seconds in results.items()}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or not baseline[name]['seconds']:
+            continue
+        ratio = result['seconds'] / baseline[name]['seconds']
+        result['baseline'] = baseline[name]['seconds']
+        result['ratio'] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Time the rules engine and search on a fixed seeded corpus.')
+    parser.add_argument('-g', '--games', type=int, default=20, help='seeded rounds in the corpus')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-i', '--iterations', type=int, default=2000, help='ISMCTS iterations per root')
+    parser.add_argument('-o', '--output', default='-', help='JSON results, - for stdout')
+    parser.add_argument('-b', '--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1,
+                        help='slowdown ratio above which a benchmark counts as a regression')
+    args = parser.parse_args(argv)
+    positions = build_corpus(args.games, args.seed)
+    results = suite(positions, args.repeat, args.iterations)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file)['results'], args.tolerance)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {'games': args.games, 'seed': args.seed, 'positions': len(positions)},
+        'results': results,
+        'regressions': regressions,
+    }
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    for name in regressions:
+        print(f'{name}: {results[name]["ratio"]:.2f}x slower than baseline', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,11 @@
 import PyInstaller.__main__
 from shutil import rmtree  
 from os import remove, path
+import atlas
 
 
 if __name__ == '__main__':
+    atlas.build_all(path.dirname(path.abspath(__file__)))
     PyInstaller.__main__.run([
         'rummy.py',
         '--noconfirm',
@@ -0,0 +1,762 @@
+from random import Random
+from itertools import combinations
+from functools import cache, lru_cache
+from enums import Suits, Ranks, Scores, Moves, States
+
+
+PLAYER = 0
+COMPUTER = 1
+JOKER = 52
+JOKERS = 3 << JOKER
+SUIT_BITS = 0x1FFF
+PLAN_LIMIT = 64
+SUIT_OF = [card // 13 if card < JOKER else 4 for card in range(JOKER + 2)]
+RANK_OF = [card % 13 + Ranks.TWO if card < JOKER else Ranks.JOKER for card in range(JOKER + 2)]
+SCORE_OF = [int(Scores[Ranks(rank).name]) for rank in RANK_OF]
+SUIT_SCORES = [0] * (SUIT_BITS + 1)
+for mask in range(1, SUIT_BITS + 1):
+    SUIT_SCORES[mask] = SUIT_SCORES[mask & (mask - 1)] + SCORE_OF[(mask & -mask).bit_length() - 1]
+
+
+def zobrist_keys(rng, count):
+    keys = [rng.getrandbits(64) for _ in range(count)]
+    chunks = []
+    for shift in range(0, count, 8):
+        chunk = [0] * 256
+        for byte in range(1, 256):
+            bit = shift + (byte & -byte).bit_length() - 1
+            chunk[byte] = chunk[byte & (byte - 1)] ^ (keys[bit] if bit < count else 0)
+        chunks.append(chunk)
+    return keys, chunks
+
+
+def zobrist(mask, chunks):
+    key = 0
+    for chunk in chunks:
+        key ^= chunk[mask & 0xFF]
+        mask >>= 8
+    return key
+
+
+ZOBRIST = Random(0)
+_, HAND_KEYS = zobrist_keys(ZOBRIST, JOKER + 2)
+_, MELD_KEYS = zobrist_keys(ZOBRIST, JOKER + 2)
+PILE_KEYS, _ = zobrist_keys(ZOBRIST, JOKER + 2)
+PHASE_KEYS, _ = zobrist_keys(ZOBRIST, len(States))
+PLAYER_KEYS, _ = zobrist_keys(ZOBRIST, 2)
+MASK_64 = (1 << 64) - 1
+
+
+def card_id(suit, rank):
+    return JOKER if rank == Ranks.JOKER else suit * 13 + rank - Ranks.TWO
+
+
+def cards_of(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def to_mask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << card
+    return mask
+
+
+def calculate_score(mask):
+    return (SUIT_SCORES[mask & SUIT_BITS]
+            + SUIT_SCORES[mask >> 13 & SUIT_BITS]
+            + SUIT_SCORES[mask >> 26 & SUIT_BITS]
+            + SUIT_SCORES[mask >> 39 & SUIT_BITS]
+            + Scores.JOKER * (mask >> JOKER).bit_count())
+
+
+@cache
+def meld_kind(cards):
+    size = len(cards)
+    if not size:
+        return None
+    suit = rank = first = None
+    is_run = is_set = True
+    jokers = 0
+    previous = None
+    for i, card in enumerate(cards):
+        if card >= JOKER:
+            jokers += 1
+            if previous is not None and previous >= JOKER:
+                is_run = is_set = False
+        elif first is None:
+            suit, rank, first = SUIT_OF[card], RANK_OF[card], RANK_OF[card] - i
+        else:
+            if SUIT_OF[card] != suit or RANK_OF[card] != first + i:
+                is_run = False
+            if RANK_OF[card] != rank:
+                is_set = False
+        previous = card
+    if jokers > 1 and size < 4:
+        return None
+    if first is None:
+        return True, 4, None
+    if is_run and first >= Ranks.TWO - 1 and first + size <= Ranks.JOKER:
+        return True, suit, None
+    if is_set and size <= 4:
+        return False, None, rank
+    return None
+
+
+def build_meld_table():
+    runs = [[] for _ in Suits]
+    sets = [[] for _ in range(Ranks.TWO, Ranks.JOKER)]
+    for suit in Suits:
+        for first in range(Ranks.TWO - 1, Ranks.ACE - 1):
+            for last in range(first + 2, Ranks.ACE + 1):
+                for joker in (None,) + tuple(range(first, last + 1)):
+                    if first < Ranks.TWO and joker != first:
+                        continue
+                    cards = tuple(JOKER if rank == joker else card_id(suit, rank)
+                                  for rank in range(first, last + 1))
+                    runs[suit].append(cards)
+    for rank in range(Ranks.TWO, Ranks.JOKER):
+        for size in (2, 3, 4):
+            for suits in combinations(Suits, size):
+                cards = tuple(card_id(suit, rank) for suit in suits)
+                sets[rank - Ranks.TWO].extend((cards, cards + (JOKER,)))
+    def legal(cards):
+        return 3 <= len(cards) and all(meld_kind(cards[:i]) for i in range(1, len(cards) + 1))
+    return ([[(to_mask(cards) >> 13 * suit & SUIT_BITS, cards) for cards in suit_runs if legal(cards)]
+             for suit, suit_runs in enumerate(runs)],
+            [[(to_mask(SUIT_OF[card] for card in cards if card < JOKER), cards)
+              for cards in rank_sets if legal(cards)] for rank_sets in sets])
+
+
+RUNS, SETS = build_meld_table()
+
+
+@cache
+def suit_melds(suit, ranks, joker):
+    return tuple(tuple(joker if card >= JOKER else card for card in cards)
+                 for mask, cards in RUNS[suit]
+                 if not mask & ~ranks and (joker is not None or JOKER not in cards))
+
+
+@cache
+def rank_melds(rank, suits, joker):
+    return tuple(tuple(joker if card >= JOKER else card for card in cards)
+                 for mask, cards in SETS[rank]
+                 if not mask & ~suits and (joker is not None or JOKER not in cards))
+
+
+def find_melds(hand):
+    jokers = hand & JOKERS
+    joker = (jokers & -jokers).bit_length() - 1 if jokers else None
+    melds = []
+    suits = [hand >> 13 * suit & SUIT_BITS for suit in range(4)]
+    for suit, ranks in enumerate(suits):
+        if ranks:
+            melds.extend(suit_melds(suit, ranks, joker))
+    clubs, spades, hearts, diamonds = suits
+    pairs = ((clubs | spades) & (hearts | diamonds)) | (clubs & spades) | (hearts & diamonds)
+    for rank in cards_of(pairs):
+        melds.extend(rank_melds(rank, hand >> rank & 1 | hand >> rank + 12 & 2
+                                | hand >> rank + 24 & 4 | hand >> rank + 36 & 8, joker))
+    return melds
+
+
+@cache
+def meld_slots(meld):
+    kind = meld_kind(meld)
+    if not kind:
+        return 0, 0
+    is_run, suit, rank = kind
+    if is_run:
+        candidates = [card_id(suit, rank) for rank in range(Ranks.TWO, Ranks.JOKER)]
+    else:
+        candidates = [card_id(suit, rank) for suit in Suits]
+    layoffs = swaps = 0
+    for card in candidates + [JOKER]:
+        if meld_kind(meld + (card,)) or meld_kind((card,) + meld):
+            layoffs |= JOKERS if card == JOKER else 1 << card
+    for i, joker in enumerate(meld):
+        if joker >= JOKER:
+            for card in candidates:
+                if meld_kind(meld[:i] + (card,) + meld[i+1:]):
+                    swaps |= 1 << card
+    return layoffs & ~to_mask(meld), swaps & ~to_mask(meld)
+
+
+def layoff_moves(hand, melds):
+    moves = []
+    for m, meld in enumerate(melds):
+        layoffs, swaps = meld_slots(meld)
+        moves.extend((Moves.LAY_OFF, m, card) for card in cards_of(hand & layoffs))
+        moves.extend((Moves.SWAP_JOKER, m, card) for card in cards_of(hand & swaps))
+    return moves
+
+
+class Card():
+
+    __slots__ = ('suit', 'rank', 'score', 'id', 'fixed')
+
+    def __init__(self, suit, rank, score):
+        self.suit = suit
+        self.rank = rank
+        self.score = score
+        self.id = card_id(suit, rank)
+        self.fixed = True
+
+    def __eq__(self, other):
+        return (isinstance(other, Card)
+                and self.suit == other.suit
+                and self.rank == other.rank)
+
+    def __hash__(self):
+        return hash((self.suit, self.rank))
+
+    def __repr__(self):
+        return ('JOKER' if self.rank == Ranks.JOKER
+                else Ranks(self.rank).name + ' OF ' + Suits(self.suit).name)
+
+
+class Hand():
+
+    def __init__(self):
+        self.cards = []
+        self.known_cards = set()
+
+    def add_card(self, card):
+        if card:
+           self.cards.append(card)
+           return True
+        return False
+
+    def sort_by_rank(self):
+        self.cards.sort(key = lambda card: (card.rank, card.suit))
+
+    def sort_by_suit(self):
+        self.cards.sort(key = lambda card: (card.suit, card.rank))
+
+    def discard(self, card):
+        return self.cards.pop(self.cards.index(card))
+
+    def calculate_score(self):
+        return sum(card.score for card in self.cards)
+
+    def find_card(self, card):
+        return next(c for c in self.cards if c.id == min(card, JOKER))
+
+
+class Deck():
+
+    def __init__(self, jokers_enabled, rng=None):
+        self.cards = []
+        self.rng = rng or Random()
+        self.generate(jokers_enabled)
+        self.shuffle()
+
+    def generate(self, jokers_enabled):
+        for suit in Suits:
+            for rank in range(Ranks.TWO, Ranks.JOKER):
+                self.cards.append(Card(suit, rank, Scores[Ranks(rank).name]))
+        if jokers_enabled:
+            self.cards.append(Card(4, Ranks.JOKER, Scores.JOKER))
+            self.cards.append(Card(4, Ranks.JOKER, Scores.JOKER))
+
+    def shuffle(self):
+        self.rng.shuffle(self.cards)
+
+    def deal(self):
+        return self.cards.pop()
+
+
+class Pile():
+
+    def __init__(self):
+        self.cards = []
+
+    def deal(self):
+        return self.cards.pop()
+
+    def put(self, card):
+        self.cards.append(card)
+
+
+class Meld():
+
+    def __init__(self):
+        self.cards = []
+        self.is_run = False
+        self.rank = None
+        self.suit = None
+
+    def put_front(self, card):
+        self.cards.append(card)
+        if self.is_valid():
+            return True
+        self.cards.pop()
+        return False
+
+    def put_back(self, card):
+        self.cards.insert(0, card)
+        if self.is_valid():
+            return True
+        self.cards.pop(0)
+        return False
+
+    def deal(self):
+        for card in reversed(self.cards):
+            if not card.fixed:
+                return self.cards.pop(self.cards.index(card))
+        return None
+
+    def swap_joker(self, card_to_swap):
+        for i, card in enumerate(self.cards):
+            if card.rank == Ranks.JOKER and card.fixed and card_to_swap.rank != Ranks.JOKER:
+                temp = self.cards[i]
+                self.cards[i] = card_to_swap
+                if not self.is_valid():
+                    self.cards[i] = temp
+                    continue
+                self.cards[i].fixed = True
+                temp.fixed = False
+                return temp
+        return None
+
+    def is_valid(self):
+        kind = meld_kind(tuple(card.id for card in self.cards))
+        if kind:
+            self.is_run, self.suit, self.rank = kind
+        return kind is not None
+
+
+class Player():
+
+    def __init__(self):
+        self.hand = Hand()
+        self.score = 0
+
+    def draw_deck(self, deck):
+        if deck.cards and self.hand.add_card(deck.deal()):
+            return True
+        return False
+
+    def draw_pile(self, pile):
+        if pile.cards:
+            card = pile.deal()
+            self.hand.add_card(card)
+            self.hand.known_cards.add(card)
+            return True
+        return False
+
+    def discard_card(self, card, pile):
+        if card in self.hand.cards:
+            pile.put(self.hand.discard(card))
+
+    def add_to_meld(self, meld, card, back=False):
+        if not back and meld.put_front(card) or meld.put_back(card):
+            self.hand.discard(card)
+            return True
+        return False
+
+    def swap_joker(self, meld, card):
+        if card in self.hand.cards:
+            joker = meld.swap_joker(card)
+            if joker:
+                self.hand.discard(card)
+                self.hand.add_card(joker)
+                self.hand.known_cards.add(joker)
+                return True
+        return False
+
+
+class GameState():
+
+    def __init__(self, jokers_enabled=False, seed=None):
+        self.jokers_enabled = jokers_enabled
+        # each round deals from its own stream, so deals do not depend on the moves of earlier rounds
+        self.seed = Random().getrandbits(64) if seed is None else seed
+        self.round = 0
+        self.rng = Random(f'{self.seed}/round/0')
+        self.snapshot_rng = Random(f'{self.seed}/snapshots')
+        self.deck = self.new_deck()
+        self.player = Player()
+        self.computer = Player()
+        self.pile = Pile()
+        self.melds = []
+        self.current_player = None
+        self.state = States.OVER
+        self.scores_calculated = False
+        self.reshuffles = 0
+
+    def new_deck(self):
+        return Deck(self.jokers_enabled, self.rng)
+
+    def new_meld(self):
+        return Meld()
+
+    def deal_cards(self):
+        for i in range(10):
+            self.player.hand.add_card(self.deck.deal())
+            self.computer.hand.add_card(self.deck.deal())
+
+    def restart_round(self):
+        for player in (self.player, self.computer):
+            player.hand.cards.clear()
+            player.hand.known_cards.clear()
+        self.pile.cards.clear()
+        self.melds.clear()
+        self.melds.append(self.new_meld())
+        self.round += 1
+        self.rng = Random(f'{self.seed}/round/{self.round}')
+        self.deck = self.new_deck()
+        self.deal_cards()
+        self.pile.put(self.deck.deal())
+        self.scores_calculated = False
+        self.reshuffles = 0
+        self.state = States.DRAW
+        self.current_player = self.rng.choice((self.player, self.computer))
+
+    def pile_to_deck(self):
+        self.deck.cards = list(self.pile.cards)
+        self.deck.shuffle()
+        self.pile.cards.clear()
+        self.reshuffles += 1
+
+    def snapshot(self, observer=None):
+        jokers = iter((JOKER, JOKER + 1))
+        def ids(cards):
+            return [next(jokers) if card.id == JOKER else card.id for card in cards]
+        new = State.__new__(State)
+        new.hands = []
+        new.known = []
+        for player in (self.player, self.computer):
+            cards = ids(player.hand.cards)
+            new.hands.append(to_mask(cards))
+            new.known.append(to_mask(card for card, c in zip(cards, player.hand.cards)
+                                     if c in player.hand.known_cards))
+        new.deck = ids(self.deck.cards)
+        new.pile = ids(self.pile.cards)
+        new.melds = [tuple(ids(meld.cards)) for meld in self.melds[:-1]]
+        new.current_player = PLAYER if self.is_players_turn() else COMPUTER
+        new.state = self.state
+        new.reshuffles = self.reshuffles
+        new.rng = self.rng
+        # an observer's view: the opponent's unseen cards and the deck order are redealt at random
+        if observer is not None:
+            new.rng = Random(self.snapshot_rng.getrandbits(64))
+            opponent = 1 - observer
+            hidden = new.hands[opponent] & ~new.known[opponent]
+            new.hands[opponent] ^= hidden
+            new.deck.extend(cards_of(hidden))
+            new.rng.shuffle(new.deck)
+            for _ in range(hidden.bit_count()):
+                new.hands[opponent] |= 1 << new.deck.pop()
+        return new
+
+    def clone_and_randomize(self, observer=None, rng=None):
+        return self.snapshot().clone_and_randomize(observer, rng)
+
+    def get_moves(self, macro=False):
+        if self.reshuffles >= 20:
+            self.state = States.OVER
+            return []
+        return self.snapshot().get_moves(macro)
+
+    def do_move(self, move):
+        if move == Moves.PASS:
+            self.progress_state()
+        elif move == Moves.DRAW_DECK:
+            self.current_player.draw_deck(self.deck)
+            self.progress_state()
+        elif move == Moves.DRAW_PILE:
+            self.current_player.draw_pile(self.pile)
+            self.progress_state()
+        elif move[0] == Moves.DISCARD:
+            self.current_player.discard_card(self.current_player.hand.find_card(move[1]), self.pile)
+            self.progress_state()
+        elif move[0] == Moves.MELD:
+            for card in move[1]:
+                self.current_player.add_to_meld(self.melds[-1], self.current_player.hand.find_card(card))
+            self.melds.append(self.new_meld())
+        elif move[0] == Moves.LAY_OFF:
+            self.current_player.add_to_meld(self.melds[move[1]], self.current_player.hand.find_card(move[2]))
+        elif move[0] == Moves.SWAP_JOKER:
+            self.current_player.swap_joker(self.melds[move[1]], self.current_player.hand.find_card(move[2]))
+        elif move[0] == Moves.PLAN:
+            for step in move[1]:
+                self.do_move(step)
+                self.fix_cards()
+            self.progress_state()
+
+    def fix_cards(self):
+        for meld in self.melds:
+            for card in meld.cards:
+                card.fixed = True
+        for card in self.player.hand.cards:
+            card.fixed = False
+
+    def progress_state(self):
+        if self.state == States.DISCARD:
+            if self.get_result(self.current_player):
+                self.state = States.OVER
+                return
+            if self.is_players_turn():
+                self.current_player = self.computer
+            else:
+                self.current_player = self.player
+            self.state = States.DRAW
+        else:
+            self.state += 1
+        if not self.deck.cards:
+            self.pile_to_deck()
+
+    def is_players_turn(self):
+        return self.current_player == self.player
+
+    def get_result(self, player):
+        if self.is_draw():
+            return 0.5
+        return 0 if player.hand.cards else 1
+
+    def is_draw(self):
+        return self.reshuffles >= 20
+
+    def is_game_over(self):
+        return self.player.score > 100 or self.computer.score > 100
+
+    def check_winners(self):
+        if self.is_draw():
+            self.state = States.OVER
+            self.scores_calculated = True
+        elif self.get_result(self.player):
+            self.player.score += self.computer.hand.calculate_score()
+            self.state = States.OVER
+            self.scores_calculated = True
+        elif self.get_result(self.computer):
+            self.computer.score += self.player.hand.calculate_score()
+            self.state = States.OVER
+            self.scores_calculated = True
+
+
+class State():
+
+    __slots__ = ('hands', 'known', 'deck', 'pile', 'melds', 'current_player', 'state', 'reshuffles', 
+                 'rng')
+
+    def clone(self):
+        new = State.__new__(State)
+        new.hands = self.hands[:]
+        new.known = self.known[:]
+        new.deck = self.deck[:]
+        new.pile = self.pile[:]
+        new.melds = self.melds[:]
+        new.current_player = self.current_player
+        new.state = self.state
+        new.reshuffles = self.reshuffles
+        new.rng = self.rng
+        return new
+
+    def clone_and_randomize(self, observer=None, rng=None):
+        new = self.clone()
+        new.rng = rng or self.rng
+        new.reshuffles = 0
+        opponent = 1 - (self.current_player if observer is None else observer)
+        hidden = self.hands[opponent] & ~self.known[opponent]
+        new.hands[opponent] ^= hidden
+        new.deck.extend(cards_of(hidden))
+        for _ in range(hidden.bit_count()):
+            new.hands[opponent] |= 1 << new.deal()
+        return new
+
+    def deal(self):
+        i = self.rng.randrange(len(self.deck))
+        self.deck[i], self.deck[-1] = self.deck[-1], self.deck[i]
+        return self.deck.pop()
+
+    def get_moves(self, macro=False):
+        moves = []
+        hand = self.hands[self.current_player]
+        if self.reshuffles >= 20:
+            self.state = States.OVER
+        elif self.state == States.DRAW:
+            moves = [Moves.DRAW_DECK, Moves.DRAW_PILE]
+        elif self.state == States.MELD:
+            if macro:
+                moves = [(Moves.PLAN, plan) for plan in meld_plans(hand)]
+            else:
+                moves = [(Moves.MELD, meld) for meld in find_melds(hand)]
+            moves.append(Moves.PASS)
+        elif self.state == States.LAY_OFF:
+            if macro:
+                moves = [(Moves.PLAN, plan) for plan in layoff_plans(hand, tuple(self.melds))]
+            else:
+                moves = layoff_moves(hand, self.melds)
+            moves.append(Moves.PASS)
+        elif self.state == States.DISCARD:
+            moves = [(Moves.DISCARD, card) for card in cards_of(hand)]
+        return moves
+
+    def do_move(self, move):
+        player = self.current_player
+        if move == Moves.PASS:
+            self.progress_state()
+        elif move == Moves.DRAW_DECK:
+            if self.deck:
+                self.hands[player] |= 1 << self.deal()
+            self.progress_state()
+        elif move == Moves.DRAW_PILE:
+            if self.pile:
+                card = 1 << self.pile.pop()
+                self.hands[player] |= card
+                self.known[player] |= card
+            self.progress_state()
+        elif move[0] == Moves.DISCARD:
+            if self.hands[player] >> move[1] & 1:
+                self.hands[player] ^= 1 << move[1]
+                self.pile.append(move[1])
+            self.progress_state()
+        elif move[0] == Moves.MELD:
+            meld = ()
+            for card in move[1]:
+                meld = self.add_to_meld(meld, card)
+            self.melds.append(meld)
+        elif move[0] == Moves.LAY_OFF:
+            self.melds[move[1]] = self.add_to_meld(self.melds[move[1]], move[2])
+        elif move[0] == Moves.SWAP_JOKER:
+            self.swap_joker(move[1], move[2])
+        elif move[0] == Moves.PLAN:
+            for step in move[1]:
+                self.do_move(step)
+            self.progress_state()
+
+    def add_to_meld(self, meld, card):
+        if meld_kind(meld + (card,)):
+            meld = meld + (card,)
+        elif meld_kind((card,) + meld):
+            meld = (card,) + meld
+        else:
+            return meld
+        self.hands[self.current_player] &= ~(1 << card)
+        return meld
+
+    def swap_joker(self, m, card):
+        meld = self.melds[m]
+        for i, joker in enumerate(meld):
+            if joker >= JOKER and card < JOKER:
+                swapped = meld[:i] + (card,) + meld[i+1:]
+                if meld_kind(swapped):
+                    self.melds[m] = swapped
+                    self.hands[self.current_player] ^= 1 << card | 1 << joker
+                    self.known[self.current_player] |= 1 << joker
+                    return
+
+    def progress_state(self):
+        if self.state == States.DISCARD:
+            if self.get_result(self.current_player):
+                self.state = States.OVER
+                return
+            self.current_player = 1 - self.current_player
+            self.state = States.DRAW
+        else:
+            self.state += 1
+        if not self.deck:
+            self.pile_to_deck()
+
+    def pile_to_deck(self):
+        self.deck = self.pile
+        self.pile = []
+        self.reshuffles += 1
+
+    def is_players_turn(self):
+        return self.current_player == PLAYER
+
+    def get_result(self, player):
+        if self.reshuffles >= 20:
+            return 0.5
+        return 0 if self.hands[player] else 1
+
+    def information_hash(self, observer):
+        key = (zobrist(self.hands[observer], HAND_KEYS) 
+               ^ PHASE_KEYS[self.state] ^ PLAYER_KEYS[self.current_player])
+        if self.pile:
+            key ^= PILE_KEYS[self.pile[-1]]
+        # melds are hashed by position: lay-off and swap moves name a meld by its index, so the
+        # same melds laid down in another order must not share a node
+        for i, meld in enumerate(self.melds):
+            key ^= zobrist(to_mask(meld), MELD_KEYS) * (2 * i + 1) & MASK_64
+        return key
+
+    def evaluate(self, player):
+        scores = [calculate_score(hand) for hand in self.hands]
+        total = scores[0] + scores[1]
+        return scores[1 - player] / total if total else 0.5
+
+
+def find_plans(start, expand):
+    plans = {start: ()}
+    frontier = [((), start)]
+    while frontier:
+        following = []
+        for plan, outcome in frontier:
+            for move, result in expand(*outcome):
+                if result not in plans:
+                    if len(plans) > PLAN_LIMIT:
+                        return [plan for plan in plans.values() if plan]
+                    plans[result] = plan + (move,)
+                    following.append((plans[result], result))
+        frontier = following
+    return [plan for plan in plans.values() if plan]
+
+
+def expand_melds(hand, table):
+    for meld in find_melds(hand):
+        yield (Moves.MELD, meld), (hand & ~to_mask(meld), tuple(sorted(table + (meld,))))
+
+
+def expand_layoffs(hand, table):
+    for move in layoff_moves(hand, table):
+        state = State.__new__(State)
+        state.hands, state.known, state.melds, state.current_player = [hand], [0], list(table), 0
+        state.do_move(move)
+        yield move, (state.hands[0], tuple(state.melds))
+
+
+@lru_cache(maxsize=4096)
+def meld_plans(hand):
+    return find_plans((hand, ()), expand_melds)
+
+
+@lru_cache(maxsize=4096)
+def layoff_plans(hand, melds):
+    return find_plans((hand, melds), expand_layoffs)
+
+
+def move_score(move):
+    if move == Moves.PASS:
+        return -1
+    if move[0] == Moves.MELD:
+        return sum(SCORE_OF[card] for card in move[1])
+    if move[0] == Moves.SWAP_JOKER:
+        return Scores.JOKER + 1
+    if move[0] == Moves.PLAN:
+        return sum(move_score(step) for step in move[1])
+    return SCORE_OF[move[2]] if move[2] < JOKER else 0
+
+
+def heuristic_move(state, legal_moves):
+    hand = state.hands[state.current_player]
+    if state.state == States.DRAW:
+        if state.pile:
+            top = state.pile[-1]
+            if (any(top in meld for meld in find_melds(hand | 1 << top))
+                or any(meld_slots(meld)[0] >> top & 1 for meld in state.melds)):
+                return Moves.DRAW_PILE
+        return Moves.DRAW_DECK
+    if state.state == States.DISCARD:
+        melded = 0
+        for meld in find_melds(hand):
+            melded |= to_mask(meld)
+        deadwood = hand & ~melded & ~JOKERS or hand & ~JOKERS or hand
+        return Moves.DISCARD, max(cards_of(deadwood), key=SCORE_OF.__getitem__)
+    return max(legal_moves, key=move_score)
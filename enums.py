@@ -55,4 +55,5 @@ class Moves(IntEnum):
     DISCARD = 3
     MELD = 4
     LAY_OFF = 5
-    SWAP_JOKER = 6
\ No newline at end of file
+    SWAP_JOKER = 6
+    PLAN = 7
\ No newline at end of file
@@ -0,0 +1,493 @@
+# Written by Peter Cowling, Edward Powley, Daniel Whitehouse (University of York, UK) September 2012 - August 2013.
+# Licence is granted to freely use and distribute for any sensible/legal purpose so long as this comment remains in any distributed code.
+# Read the article accompanying this code https://www.aifactory.co.uk/newsletter/2013_01_reduce_burden.htm
+import os
+import sys
+import json
+import warnings
+from math import sqrt, log
+from random import Random
+from time import time, perf_counter
+from array import array
+from collections import Counter, OrderedDict
+from contextlib import nullcontext
+from threading import Thread, Lock, Event
+from queue import SimpleQueue
+from concurrent.futures import ProcessPoolExecutor, Future
+from enums import Moves
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+VECTORIZE = 16
+CHECK_EVERY = 16
+LEAF = {}
+
+
+class Node:
+
+    __slots__ = ('player', 'children', 'moves', 'nodes', 'visits', 'wins', 'considerations')
+
+    def __init__(self, player=None):
+        self.player = player
+        # most nodes stay leaves, so they share empty placeholders until their first child
+        self.children = LEAF
+        self.moves = self.nodes = self.visits = self.wins = self.considerations = ()
+
+    def get_untried_moves(self, legal_moves):
+        return [move for move in legal_moves if move not in self.children]
+
+    def select_child(self, legal_moves, exploration=0.7):
+        if np is not None and len(legal_moves) >= VECTORIZE:
+            visits = np.frombuffer(self.visits)
+            wins = np.frombuffer(self.wins)
+            considerations = np.frombuffer(self.considerations)
+            if len(legal_moves) == len(self.nodes):
+                considerations += 1
+                values = wins / visits + exploration * np.sqrt(np.log(considerations) / visits)
+                return int(values.argmax())
+            legal = np.fromiter((self.children[move] for move in legal_moves), np.intp, len(legal_moves))
+            considerations[legal] += 1
+            values = (wins[legal] / visits[legal] 
+                      + exploration * np.sqrt(np.log(considerations[legal]) / visits[legal]))
+            return int(legal[values.argmax()])
+        visits, wins, considerations = self.visits, self.wins, self.considerations
+        best, best_value = None, -1.0
+        for move in legal_moves:
+            i = self.children[move]
+            considerations[i] += 1
+            value = wins[i] / visits[i] + exploration * sqrt(log(considerations[i]) / visits[i])
+            if value > best_value:
+                best, best_value = i, value
+        return best
+
+    def add_child(self, move, child):
+        if not self.nodes:
+            self.children = {}
+            self.moves = []
+            self.nodes = []
+            self.visits = array('d')
+            self.wins = array('d')
+            self.considerations = array('d')
+        self.children[move] = len(self.nodes)
+        self.moves.append(move)
+        self.nodes.append(child)
+        self.visits.append(0)
+        self.wins.append(0)
+        self.considerations.append(1)
+        return self.children[move]
+
+    def visit_counts(self):
+        return {move: int(self.visits[i]) for move, i in self.children.items()}
+
+
+class SearchStats:
+
+    __slots__ = ('iterations', 'nodes', 'depth', 'rollout_moves', 'determinize', 'select', 'expand', 
+                 'rollout', 'backprop', 'lock', 'elapsed', 'tree_size', 'reused', 'visits')
+
+    PHASES = ('determinize', 'select', 'expand', 'rollout', 'backprop', 'lock')
+
+    def __init__(self):
+        self.iterations = 0
+        self.nodes = 0
+        self.depth = 0
+        self.rollout_moves = 0
+        self.determinize = 0.0
+        self.select = 0.0
+        self.expand = 0.0
+        self.rollout = 0.0
+        self.backprop = 0.0
+        self.lock = 0.0
+        self.elapsed = 0.0
+        self.tree_size = 0
+        self.reused = 0
+        self.visits = {}
+
+    def merge(self, other):
+        self.iterations += other.iterations
+        self.nodes += other.nodes
+        self.depth = max(self.depth, other.depth)
+        self.rollout_moves += other.rollout_moves
+        for phase in self.PHASES:
+            setattr(self, phase, getattr(self, phase) + getattr(other, phase))
+        return self
+
+    def rollout_length(self):
+        return self.rollout_moves / max(self.iterations, 1)
+
+    def iterations_per_second(self):
+        return self.iterations / self.elapsed if self.elapsed else 0.0
+
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'iterations': self.iterations,
+            'elapsed': self.elapsed,
+            'phases': {phase: getattr(self, phase) for phase in self.PHASES},
+            'rollout_length': self.rollout_length(),
+            'nodes': self.nodes,
+            'tree_size': self.tree_size,
+            'depth': self.depth,
+            'reused': self.reused,
+            'iterations_per_second': self.iterations_per_second(),
+            'nodes_per_second': self.nodes_per_second(),
+            'visits': {move_name(move): visits for move, visits in self.visits.items()},
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict())
+
+    def to_prometheus(self, prefix='rummy_ismcts'):
+        lines = []
+        def metric(name, text, samples):
+            lines.append(f'# HELP {prefix}_{name} {text}')
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            for labels, value in samples:
+                lines.append(f'{prefix}_{name}{labels} {value}')
+        metric('iterations', 'Iterations run by the last search.', [('', self.iterations)])
+        metric('elapsed_seconds', 'Wall time of the last search.', [('', self.elapsed)])
+        metric('phase_seconds', 'Time spent in each search phase, summed over workers.', 
+               [(f'{{phase="{phase}"}}', getattr(self, phase)) for phase in self.PHASES])
+        metric('rollout_length', 'Average number of rollout moves per iteration.', 
+               [('', self.rollout_length())])
+        metric('tree_nodes', 'Nodes reachable from the root after the last search.', 
+               [('', self.tree_size)])
+        metric('tree_depth', 'Deepest selection path of the last search.', [('', self.depth)])
+        metric('nodes_per_second', 'Nodes expanded per second of wall time.', 
+               [('', self.nodes_per_second())])
+        metric('root_visits', 'Visits of each legal root move.', 
+               [(f'{{move="{move_name(move)}"}}', visits) for move, visits in self.visits.items()])
+        return '\n'.join(lines) + '\n'
+
+
+def move_name(move):
+    if isinstance(move, Moves):
+        return move.name
+    kind, *args = move
+    if kind == Moves.PLAN:
+        return 'PLAN(' + '; '.join(map(move_name, args[0])) + ')'
+    return ' '.join([Moves(kind).name] + [','.join(map(str, arg)) if isinstance(arg, tuple) else str(arg) 
+                                          for arg in args])
+
+
+def jsonl_exporter(file):
+    def export(stats):
+        file.write(stats.to_json() + '\n')
+        file.flush()
+    return export
+
+
+def prometheus_exporter(path, prefix='rummy_ismcts'):
+    def export(stats):
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(stats.to_prometheus(prefix))
+        os.replace(path + '.tmp', path)
+    return export
+
+
+def tree_size(root_node):
+    seen = {id(root_node)}
+    stack = [root_node]
+    while stack:
+        for child in stack.pop().nodes:
+            if id(child) not in seen:
+                seen.add(id(child))
+                stack.append(child)
+    return len(seen)
+
+
+def random_rollout(state, legal_moves):
+    return state.rng.choice(legal_moves)
+
+
+def search_root(root_state, deadline, iterations=None, exploration=0.7, rollout=random_rollout, 
+                depth=None, macro=False, table_size=0, seed=None):
+    search = ISMCTS(exploration, rollout=rollout, depth=depth, macro=macro, table_size=table_size, 
+                    seed=seed)
+    stats = SearchStats()
+    return search.search(root_state, deadline, iterations=iterations, stats=stats).visit_counts(), stats
+
+
+class ISMCTS:
+
+    def __init__(self, exploration=0.7, workers=1, parallel='root', virtual_loss=1, 
+                 rollout=random_rollout, depth=None, macro=False, table_size=0, seed=None, 
+                 on_stats=None):
+        if parallel not in ('root', 'tree'):
+            raise ValueError(f"parallel must be 'root' or 'tree', not {parallel!r}")
+        # Tree mode shares one in-process tree between threads. Under the GIL they take turns,
+        # so it only searches in parallel on free-threaded builds; use 'root' everywhere else.
+        if parallel == 'tree' and workers > 1 and getattr(sys, '_is_gil_enabled', lambda: True)():
+            warnings.warn("parallel='tree' runs serially while the GIL is enabled, use 'root'", 
+                          RuntimeWarning, stacklevel=2)
+        self.best_move = None
+        self.stats = SearchStats()
+        self.on_stats = on_stats
+        self.rng = Random(seed)
+        self.root = None
+        self.ponder_thread = None
+        self.cancelled = Event()
+        self.reused = 0
+        self.reuse_hits = 0
+        self.reuse_misses = 0
+        self.exploration = exploration
+        self.rollout = rollout
+        self.depth = depth
+        self.macro = macro
+        self.table = OrderedDict()
+        self.table_size = table_size
+        self.workers = workers
+        self.parallel = parallel
+        self.virtual_loss = virtual_loss if parallel == 'tree' else 0
+        self.lock = Lock() if parallel == 'tree' else nullcontext()
+        self.executor = None
+
+    def run(self, root_state, timeout=2, iterations=None):
+        start = perf_counter()
+        stats = self.stats = SearchStats()
+        legal_moves = root_state.get_moves(self.macro)
+        if len(legal_moves) <= 1:
+            self.best_move = legal_moves[0] if legal_moves else None
+            self.report(stats, start)
+            return
+        deadline = time() + timeout if iterations is None else float('inf')
+        share = None if iterations is None else -(-iterations // self.workers)
+        root_node = self.root = self.root or Node(root_state.current_player)
+        self.reused = int(sum(root_node.visits))
+        if self.workers > 1 and self.parallel == 'root':
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers - 1)
+            futures = [self.executor.submit(search_root, root_state, deadline, share, 
+                                            self.exploration, self.rollout, self.depth, self.macro, 
+                                            self.table_size, self.rng.getrandbits(64)) 
+                       for _ in range(self.workers - 1)]
+            self.search(root_state, deadline, root_node, iterations=share, stats=stats)
+            visits = Counter(root_node.visit_counts())
+            for future in futures:
+                worker_visits, worker_stats = future.result()
+                visits.update(worker_visits)
+                stats.merge(worker_stats)
+        else:
+            shares = [SearchStats() for _ in range(self.workers - 1)]
+            threads = [Thread(target=self.search, 
+                              args=(root_state, deadline, root_node, None, share, 
+                                    Random(self.rng.getrandbits(64)), thread_stats))
+                       for thread_stats in shares]
+            for thread in threads:
+                thread.start()
+            self.search(root_state, deadline, root_node, iterations=share, stats=stats)
+            for thread, thread_stats in zip(threads, shares):
+                thread.join()
+                stats.merge(thread_stats)
+            visits = root_node.visit_counts()
+        self.best_move = max(legal_moves, key=lambda move: visits.get(move, 0))
+        stats.visits = {move: visits.get(move, 0) for move in legal_moves}
+        stats.reused = self.reused
+        stats.tree_size = tree_size(root_node)
+        self.report(stats, start)
+
+    def report(self, stats, start):
+        stats.elapsed = perf_counter() - start
+        if self.on_stats is not None:
+            self.on_stats(stats)
+
+    def ponder(self, root_state, observer, timeout=60):
+        self.stop()
+        self.root = self.root or Node(root_state.current_player)
+        self.ponder_thread = Thread(target=self.search, 
+                                    args=(root_state, time() + timeout, self.root, observer), 
+                                    daemon=True)
+        self.ponder_thread.start()
+
+    def stop(self):
+        if self.ponder_thread is not None:
+            self.cancelled.set()
+            self.ponder_thread.join()
+            self.cancelled.clear()
+            self.ponder_thread = None
+
+    def advance(self, *moves):
+        self.stop()
+        for move in moves:
+            if self.root is None:
+                return
+            if move in self.root.children:
+                self.root = self.root.nodes[self.root.children[move]]
+                self.reuse_hits += 1
+            elif move != Moves.PASS:
+                self.root = None
+                self.reuse_misses += 1
+
+    def reset(self):
+        self.stop()
+        self.root = None
+        self.table.clear()
+
+    def reuse_rate(self):
+        return self.reuse_hits / max(self.reuse_hits + self.reuse_misses, 1)
+
+    def search(self, root_state, deadline, root_node=None, observer=None, iterations=None, rng=None, 
+               stats=None):
+        root_node = root_node or Node(root_state.current_player)
+        rng = rng or self.rng
+        stats = stats or SearchStats()
+        legal_moves = root_state.get_moves(self.macro) if observer is None else None
+        start, done = time(), 0
+        while not self.cancelled.is_set():
+            batch = CHECK_EVERY if iterations is None else min(CHECK_EVERY, iterations - done)
+            for _ in range(batch):
+                self.iterate(root_node, root_state, observer, rng, stats)
+            done += batch
+            now = time()
+            if now >= deadline or done == iterations:
+                break
+            if legal_moves:
+                if iterations is None:
+                    remaining = (deadline - now) * done / max(now - start, 1e-9)
+                else:
+                    remaining = iterations - done
+                if self.parallel == 'tree':
+                    remaining *= self.workers
+                if self.decided(root_node, legal_moves, remaining):
+                    break
+        return root_node
+
+    def decided(self, root_node, legal_moves, remaining):
+        visits = root_node.visit_counts()
+        first, second = sorted([visits.get(move, 0) for move in legal_moves] + [0], reverse=True)[:2]
+        return first - second > remaining
+
+    def transpose(self, state, observer):
+        if not self.table_size:
+            return Node(state.current_player)
+        key = state.information_hash(observer)
+        if key in self.table:
+            self.table.move_to_end(key)
+            return self.table[key]
+        node = self.table[key] = Node(state.current_player)
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)
+        return node
+
+    def iterate(self, root_node, root_state, observer=None, rng=None, stats=None):
+        node = root_node
+        path = []
+        seen = {id(root_node)}
+        rng = rng or self.rng
+        stats = stats or SearchStats()
+        start = perf_counter()
+        state = root_state.clone_and_randomize(observer, rng)
+        observer = root_state.current_player if observer is None else observer
+        selecting = perf_counter()
+        expand = waited = 0.0
+        while legal_moves := state.get_moves(self.macro):
+            waiting = perf_counter()
+            with self.lock:
+                waited += perf_counter() - waiting
+                if untried_moves := node.get_untried_moves(legal_moves):
+                    if legal_moves == [Moves.PASS]:
+                        state.do_move(Moves.PASS)
+                        continue
+                    expanding = perf_counter()
+                    move = rng.choice(untried_moves)
+                    state.do_move(move)
+                    i = node.add_child(move, self.transpose(state, observer))
+                    expand = perf_counter() - expanding
+                    stats.nodes += 1
+                else:
+                    i = node.select_child(legal_moves, self.exploration)
+                    move = node.moves[i]
+                node.visits[i] += self.virtual_loss
+                path.append((node, i))
+                node = node.nodes[i]
+                repeated = id(node) in seen
+                seen.add(id(node))
+            if untried_moves:
+                break
+            state.do_move(move)
+            # transpositions can lead back to a node on the path (draw the pile top, discard it);
+            # roll out from here instead of walking the cycle forever
+            if repeated:
+                break
+        rolling = perf_counter()
+        depth = 0
+        while (legal_moves := state.get_moves()) and depth != self.depth:
+            state.do_move(self.rollout(state, legal_moves))
+            depth += 1
+        result = state.evaluate if legal_moves else state.get_result
+        backing = perf_counter()
+        with self.lock:
+            locked = perf_counter()
+            for node, i in path:
+                node.visits[i] += 1 - self.virtual_loss
+                node.wins[i] += result(node.player)
+        stats.iterations += 1
+        stats.depth = max(stats.depth, len(path))
+        stats.rollout_moves += depth
+        stats.determinize += selecting - start
+        stats.select += rolling - selecting - expand - waited
+        stats.expand += expand
+        stats.rollout += backing - rolling
+        stats.backprop += perf_counter() - locked
+        stats.lock += waited + locked - backing
+
+
+class SearchWorker:
+
+    def __init__(self, search):
+        self.search = search
+        self.pondering = False
+        self.requests = SimpleQueue()
+        self.thread = Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while (request := self.requests.get()) is not None:
+            future, method, args = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(method(*args))
+            except BaseException as error:
+                future.set_exception(error)
+
+    def submit(self, method, *args):
+        future = Future()
+        self.requests.put((future, method, args))
+        return future
+
+    def think(self, state, timeout=2, iterations=None):
+        self.pondering = False
+        return self.submit(self.choose, state, timeout, iterations)
+
+    def choose(self, state, timeout, iterations):
+        self.search.stop()
+        self.search.run(state, timeout, iterations)
+        move, self.search.best_move = self.search.best_move, None
+        return move
+
+    def ponder(self, state, observer, timeout=60):
+        self.pondering = True
+        return self.submit(self.search.ponder, state, observer, timeout)
+
+    def advance(self, *moves):
+        self.pondering = False
+        return self.submit(self.search.advance, *moves)
+
+    def reset(self):
+        self.pondering = False
+        return self.submit(self.search.reset)
+
+    def stop(self):
+        self.pondering = False
+        return self.submit(self.search.stop)
+
+    def close(self):
+        self.stop()
+        self.requests.put(None)
+        self.thread.join()
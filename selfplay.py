@@ -0,0 +1,175 @@
+import sys
+import json
+from random import Random
+from argparse import ArgumentParser
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import engine
+from enums import States
+from ismcts import ISMCTS, random_rollout
+
+
+ROLLOUTS = {'random': random_rollout, 'heuristic': engine.heuristic_move}
+MAX_ROUNDS = 100
+
+
+def parse_value(value):
+    for parse in (int, float):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    if value in ('true', 'false'):
+        return value == 'true'
+    return ROLLOUTS.get(value, value)
+
+
+def parse_agent(spec):
+    name, _, options = spec.partition(':')
+    settings = {}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        settings[key] = parse_value(value)
+    if name not in AGENTS:
+        raise ValueError(f'unknown agent {name!r}, expected one of {", ".join(AGENTS)}')
+    return name, settings
+
+
+class RandomAgent:
+
+    macro = False
+
+    def __init__(self, seed=None):
+        self.rng = Random(seed)
+
+    def choose(self, state, legal_moves):
+        return self.rng.choice(legal_moves)
+
+    def advance(self, move):
+        pass
+
+    def reset(self):
+        pass
+
+
+class HeuristicAgent(RandomAgent):
+
+    def choose(self, state, legal_moves):
+        return engine.heuristic_move(state, legal_moves)
+
+
+class SearchAgent:
+
+    def __init__(self, timeout=1, iterations=None, **settings):
+        self.timeout = timeout
+        self.iterations = iterations
+        self.search = ISMCTS(**settings)
+        self.macro = self.search.macro
+
+    def choose(self, state, legal_moves):
+        self.search.run(state, self.timeout, self.iterations)
+        return self.search.best_move
+
+    def advance(self, move):
+        self.search.advance(move)
+
+    def reset(self):
+        self.search.reset()
+
+
+AGENTS = {'random': RandomAgent, 'heuristic': HeuristicAgent, 'ismcts': SearchAgent}
+
+
+def play_round(game, agents, stats):
+    agents[0].reset()
+    agents[1].reset()
+    game.restart_round()
+    while game.state != States.OVER:
+        player = engine.PLAYER if game.is_players_turn() else engine.COMPUTER
+        snapshot = game.snapshot(player)
+        legal_moves = snapshot.get_moves(agents[player].macro)
+        if not legal_moves:
+            break
+        start = perf_counter()
+        move = agents[player].choose(snapshot, legal_moves)
+        stats['think_time'][player] += perf_counter() - start
+        stats['moves'][player] += 1
+        for agent in agents:
+            agent.advance(move)
+        game.do_move(move)
+        game.fix_cards()
+    game.state = States.OVER
+    game.check_winners()
+
+
+def play_match(index, specs, jokers_enabled=True, seed=None):
+    rng = Random(seed)
+    agents = []
+    for name, settings in map(parse_agent, specs):
+        settings.setdefault('seed', rng.getrandbits(64))
+        agents.append(AGENTS[name](**settings))
+    game = engine.GameState(jokers_enabled, rng.getrandbits(64))
+    stats = {'think_time': [0.0, 0.0], 'moves': [0, 0]}
+    start = perf_counter()
+    rounds = draws = 0
+    while not game.is_game_over() and rounds < MAX_ROUNDS:
+        play_round(game, agents, stats)
+        rounds += 1
+        draws += game.is_draw()
+    scores = [game.player.score, game.computer.score]
+    return {
+        'game': index,
+        'seed': seed,
+        'agents': list(specs),
+        'scores': scores,
+        'winner': scores.index(max(scores)) if game.is_game_over() else None,
+        'rounds': rounds,
+        'draws': draws,
+        'moves': stats['moves'],
+        'think_time': [round(t, 4) for t in stats['think_time']],
+        'duration': round(perf_counter() - start, 4),
+    }
+
+
+def run(games, specs, output, workers=1, jokers_enabled=True, seed=0, swap=True):
+    for spec in specs:
+        parse_agent(spec)
+    tally = [0, 0]
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(play_match, i, specs[::-1] if swap and i % 2 else specs,
+                                   jokers_enabled, seed + i)
+                   for i in range(games)]
+        for future in as_completed(futures):
+            result = future.result()
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+            if result['winner'] is not None:
+                tally[result['winner'] ^ (swap and result['game'] % 2)] += 1
+    return tally
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Play rummy matches to 100 points without a window.')
+    parser.add_argument('agents', nargs=2, metavar='AGENT',
+                        help='random, heuristic or ismcts[:key=value,...], '
+                             'e.g. ismcts:timeout=0.5,rollout=heuristic,depth=20')
+    parser.add_argument('-n', '--games', type=int, default=10)
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('-o', '--output', default='-', help='JSONL file, - for stdout')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--no-jokers', dest='jokers_enabled', action='store_false')
+    parser.add_argument('--no-swap', dest='swap', action='store_false',
+                        help='do not alternate seats between games')
+    args = parser.parse_args(argv)
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    try:
+        tally = run(args.games, args.agents, output, args.workers, args.jokers_enabled,
+                    args.seed, args.swap)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f'{args.agents[0]}: {tally[0]}  {args.agents[1]}: {tally[1]}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import pytest
+import engine
+from engine import JOKER, card_id, meld_kind
+from enums import Suits, Ranks, Moves, States
+
+
+def hearts(*ranks):
+    return tuple(JOKER if rank is None else card_id(Suits.HEARTS, rank) for rank in ranks)
+
+
+def fives(*suits):
+    return tuple(JOKER if suit is None else card_id(suit, Ranks.FIVE) for suit in suits)
+
+
+@pytest.mark.parametrize('cards', [
+    hearts(4, 5, 6),
+    hearts(None, 5, 6),
+    hearts(4, None, 6),
+    hearts(None, 5, None, 7),
+    hearts(None, 2, 3),
+    hearts(Ranks.QUEEN, Ranks.KING, Ranks.ACE),
+    fives(Suits.CLUBS, Suits.SPADES, Suits.HEARTS),
+    fives(None, Suits.SPADES, Suits.HEARTS),
+    fives(None, Suits.SPADES, None, Suits.HEARTS),
+    fives(Suits.CLUBS, None, Suits.HEARTS, None),
+])
+def test_valid_melds(cards):
+    assert meld_kind(cards)
+
+
+@pytest.mark.parametrize('cards', [
+    hearts(None, 5, None, 9),
+    hearts(5, None, 9),
+    hearts(4, 6, 7),
+    hearts(None, None, 5, 6),
+    hearts(4, None, None, 7),
+    hearts(None, 5, None),
+    hearts(Ranks.KING, Ranks.ACE, None),
+    fives(None, None, Suits.SPADES, Suits.HEARTS),
+    fives(Suits.SPADES, Suits.HEARTS, None, None),
+    fives(None, Suits.SPADES, None),
+    fives(Suits.CLUBS, Suits.SPADES, Suits.HEARTS, Suits.DIAMONDS, None),
+    (card_id(Suits.HEARTS, 5), card_id(Suits.SPADES, 6), card_id(Suits.HEARTS, 7)),
+])
+def test_invalid_melds(cards):
+    assert not meld_kind(cards)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_find_melds_are_valid(seed):
+    game = engine.GameState(True, seed)
+    game.restart_round()
+    hand = game.snapshot().hands[engine.PLAYER] | engine.JOKERS
+    for meld in engine.find_melds(hand):
+        assert len(meld) >= 3 and meld_kind(meld)
+        assert not engine.to_mask(meld) & ~hand
+
+
+def canonical(state):
+    def joker(card):
+        return min(card, JOKER)
+    return ([hand & ~engine.JOKERS for hand in state.hands],
+            [(hand & engine.JOKERS).bit_count() for hand in state.hands],
+            [known & hand & ~engine.JOKERS for known, hand in zip(state.known, state.hands)],
+            list(map(joker, state.pile)),
+            [tuple(map(joker, meld)) for meld in state.melds],
+            sorted(map(joker, state.deck)),
+            state.current_player, state.state, state.reshuffles)
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('macro', [False, True])
+def test_engine_matches_game_moves(seed, macro):
+    game = engine.GameState(True, seed)
+    game.restart_round()
+    for _ in range(300):
+        state = game.snapshot()
+        legal_moves = state.get_moves(macro)
+        assert legal_moves == game.get_moves(macro)
+        if not legal_moves:
+            break
+        move = engine.heuristic_move(state, legal_moves)
+        state.do_move(move)
+        game.do_move(move)
+        game.fix_cards()
+        if move == Moves.DRAW_DECK:
+            # the engine deals a random deck card, the game deals the top one
+            assert [hand.bit_count() for hand in game.snapshot().hands] == \
+                   [hand.bit_count() for hand in state.hands]
+        else:
+            assert canonical(game.snapshot()) == canonical(state)
+        if game.state == States.OVER:
+            break
+
+
+def test_rounds_deal_the_same_cards_whatever_was_played():
+    deals = []
+    for moves in (0, 40):
+        game = engine.GameState(True, 7)
+        game.restart_round()
+        for _ in range(moves):
+            state = game.snapshot()
+            if not (legal_moves := state.get_moves()):
+                break
+            game.do_move(engine.heuristic_move(state, legal_moves))
+            game.fix_cards()
+            game.snapshot(engine.COMPUTER)
+        game.restart_round()
+        deals.append((game.snapshot().hands, game.is_players_turn()))
+    assert deals[0] == deals[1]
+
+
+def test_reshuffle_cap_ends_the_round_without_a_winner():
+    game = engine.GameState(True, 0)
+    game.restart_round()
+    game.reshuffles = 20
+    assert game.get_moves() == []
+    game.check_winners()
+    assert game.state == States.OVER and game.scores_calculated and game.is_draw()
+    assert game.player.score == game.computer.score == 0
@@ -0,0 +1,19 @@
+from threading import Thread
+import engine
+from ismcts import ISMCTS
+
+
+def test_transposition_cycle_ends_selection():
+    # drawing the pile top and discarding it again repeats the information set
+    game = engine.GameState(True, 10)
+    game.restart_round()
+    for _ in range(60):
+        state = game.snapshot()
+        game.do_move(engine.heuristic_move(state, state.get_moves()))
+        game.fix_cards()
+    search = ISMCTS(rollout=engine.heuristic_move, depth=20, table_size=1 << 12, seed=10)
+    thread = Thread(target=search.search, args=(game.snapshot(), float('inf')),
+                    kwargs={'iterations': 3000}, daemon=True)
+    thread.start()
+    thread.join(30)
+    assert not thread.is_alive()